@@ -1,35 +1,143 @@
+import re
+import json
+import os
+import threading
+from datetime import datetime
 import pandas as pd
 import requests
-from bs4 import BeautifulSoup
-from typing import Optional
-from config import FINANCE_SITES, DEFAULT_HEADERS
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.exceptions import HTTPError as UrllibHTTPError
+from bs4 import BeautifulSoup, SoupStrainer
+from typing import Dict, Iterable, Optional
+from concurrent.futures import ThreadPoolExecutor
+from config import FINANCE_SITES, DEFAULT_HEADERS, EPS_CACHE_PATH
 import streamlit as st
-def get_eps_from_web(stock_code: str) -> Optional[float]:
+
+_RETRY = Retry(
+    total=3,
+    backoff_factor=0.3,
+    status_forcelist=[429, 500, 502, 503, 504],
+    allowed_methods=["GET"],
+    respect_retry_after_header=True
+)
+# (连接超时, 读取超时)：不可达的主机3秒内快速失败，不压缩正常读取时间
+_HTTP_TIMEOUT = (3.0, 7.0)
+
+@st.cache_resource
+def _http() -> requests.Session:
+    """
+    进程级共享会话：跨重跑与多个会话复用连接池与TLS会话，
+    重试交给适配器按指数退避处理
+    """
+    session = requests.Session()
+    session.headers.update(DEFAULT_HEADERS)
+    session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=10, max_retries=_RETRY))
+    return session
+
+# EPS快速路径：直接在原始HTML上匹配“每股收益”后的数值，无需构建DOM
+# 标签与中间只允许整段跳过的HTML标签、空白和冒号，避免误取标签属性或“2024年报”等标注中的数字
+_EPS_RE = re.compile(r"每股收益(?:\s|<[^>]*>|[:：])*([-+]?\d+(?:\.\d+)?)(?![\d.年])")
+# 快速路径的合理取值范围，超出时视为误匹配，交给DOM解析
+_EPS_MAX_ABS = 200.0
+# 只解析页面前64KB，“每股收益”字段位于页面靠前位置
+_MAX_BODY_BYTES = 64 * 1024
+# 正则未命中时的回退解析：只解析<span>标签，避免构建整棵DOM树
+_SPAN_ONLY = SoupStrainer("span")
+
+def _fetch_eps_uncached(stock_code: str) -> Optional[float]:
     """
-    从网页获取实时EPS（每股收益），增加重试机制提高稳定性
+    从网页获取实时EPS（每股收益），复用会话连接并由适配器自动重试
     """
     url = FINANCE_SITES["sina"].format(stock_code)
-    max_retries = 3
-    retry_delay = 2  # 秒
-    
-    for retry in range(max_retries):
-        try:
-            response = requests.get(url, headers=DEFAULT_HEADERS, timeout=15)
+    try:
+        with _http().get(url, timeout=_HTTP_TIMEOUT, stream=True) as response:
             response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-            # 这里需要根据实际网页结构调整解析逻辑
-            eps_tag = soup.find("span", text="每股收益")
-            if eps_tag:
-                eps_text = eps_tag.find_next_sibling().text
-                return float(eps_text)
-            return None
-        except requests.exceptions.RequestException as e:
-            print(f"EPS获取失败 (重试 {retry+1}/{max_retries}): {e}")
-            if retry < max_retries - 1:
-                import time
-                time.sleep(retry_delay)
-            else:
-                return None
+            body = response.raw.read(_MAX_BODY_BYTES, decode_content=True)
+            # 丢弃剩余响应体（不缓存在内存中），连接读完后才会归还连接池以复用keep-alive
+            response.raw.drain_conn()
+            html = body.decode(response.encoding or "utf-8", errors="replace")
+        match = _EPS_RE.search(html)
+        if match and abs(float(match.group(1))) <= _EPS_MAX_ABS:
+            return float(match.group(1))
+        soup = BeautifulSoup(html, 'lxml', parse_only=_SPAN_ONLY)
+        # 这里需要根据实际网页结构调整解析逻辑
+        eps_tag = soup.find("span", string="每股收益")
+        if eps_tag:
+            eps_text = eps_tag.find_next_sibling().text
+            return float(eps_text)
+        return None
+    except (requests.exceptions.RequestException, UrllibHTTPError) as e:
+        print(f"EPS获取失败: {e}")
+        return None
+
+# 磁盘EPS缓存按“代码:日期”存储，跨进程重启与多个会话共享，当日有效
+_EPS_DISK_LOCK = threading.Lock()
+
+def _load_eps_disk_cache() -> Dict[str, float]:
+    """读取磁盘EPS缓存，文件不存在或损坏时返回空字典"""
+    try:
+        with open(EPS_CACHE_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_eps_to_disk(key: str, eps: float) -> None:
+    """写入一条EPS缓存，只保留当日条目，先写临时文件再原子替换"""
+    today = key.rsplit(":", 1)[1]
+    with _EPS_DISK_LOCK:
+        cache = {k: v for k, v in _load_eps_disk_cache().items() if k.endswith(f":{today}")}
+        cache[key] = eps
+        # 锁只在进程内有效；临时文件名带上进程号与线程号，多个进程同时写入时互不覆盖
+        tmp_path = EPS_CACHE_PATH.with_name(f"{EPS_CACHE_PATH.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(cache, f, ensure_ascii=False)
+            os.replace(tmp_path, EPS_CACHE_PATH)
+        except OSError as e:
+            print(f"EPS缓存写入失败: {e}")
+            tmp_path.unlink(missing_ok=True)
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _get_eps_cached(stock_code: str) -> float:
+    """
+    缓存成功获取的EPS；失败时抛出异常，避免把临时失败写入缓存
+    进程内缓存未命中时先查磁盘缓存，仍未命中才发起网络请求
+    """
+    key = f"{stock_code}:{datetime.today().strftime('%Y%m%d')}"
+    eps = _load_eps_disk_cache().get(key)
+    if eps is not None:
+        return eps
+    eps = _fetch_eps_uncached(stock_code)
+    if eps is None:
+        raise LookupError(f"未获取到{stock_code}的EPS")
+    _save_eps_to_disk(key, eps)
+    return eps
+
+def get_eps_from_web(stock_code: str) -> Optional[float]:
+    """
+    获取实时EPS（每股收益），同一股票一小时内直接命中缓存
+    """
+    try:
+        return _get_eps_cached(stock_code)
+    except LookupError:
+        return None
+
+def get_eps_bulk(stock_codes: Iterable[str], max_workers: int = 8) -> Dict[str, Optional[float]]:
+    """
+    并发获取多只股票的EPS，线程数受限以免触发新浪限流
+
+    Args:
+    stock_codes: 股票代码列表（含市场前缀）
+    max_workers: 最大并发请求数
+    Returns:
+    股票代码到EPS的映射，获取失败的为None
+    """
+    codes = list(dict.fromkeys(stock_codes))
+    if not codes:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(codes))) as executor:
+        return dict(zip(codes, executor.map(get_eps_from_web, codes)))
 def calculate_pe_ratio(
     stock_history: pd.DataFrame,
     stock_code: str,
@@ -57,12 +165,9 @@ def calculate_pe_ratio(
         eps = 1.5 # 模拟值
     # 计算PE = 当前股价 / EPS
     current_price = stock_history['close'].iloc[-1]  # 使用最新收盘价作为当前股价
-    pe_series = pd.Series([current_price / eps] * len(stock_history), index=stock_history.index)
-    # 生成结果
-    result_df = pd.DataFrame({
-    'close': stock_history['close'],
-    'EPS': eps,
-    'PE': pe_series,
-    'PE_MA': pe_series.rolling(window=period_days).mean()
-    }).dropna()
+    pe_const = current_price / eps
+    # 先切掉前period_days-1行（与滚动均值预热期被dropna丢弃的行一致），
+    # 只为保留的行构建结果；PE为常数，其移动平均同样为常数，直接按标量广播
+    close_prices = stock_history['close'].iloc[period_days - 1:]
+    result_df = close_prices.to_frame('close').assign(EPS=eps, PE=pe_const, PE_MA=pe_const)
     return result_df
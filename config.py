@@ -2,9 +2,13 @@ from pathlib import Path
 # 项目根目录
 ROOT_DIR = Path(__file__).parent
 DATA_DIR = ROOT_DIR / "data"
-CSV_PATH = DATA_DIR / "stock_history.csv"
+HISTORY_PATH = DATA_DIR / "stock_history.parquet"
+EPS_CACHE_PATH = DATA_DIR / "eps_cache.json"
+# akshare查询结果的磁盘缓存目录
+CACHE_DIR = DATA_DIR / "cache"
 # 创建数据目录
 DATA_DIR.mkdir(exist_ok=True)
+CACHE_DIR.mkdir(exist_ok=True)
 # 第三方数据源
 FINANCE_SITES = {
  "sina": "https://finance.sina.com.cn/realstock/company/{}/nc.shtml"
@@ -1,9 +1,53 @@
+import re
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
 from typing import Optional
 import akshare as ak # 假设你用 akshare 获取数据
-from config import CSV_PATH
+from config import HISTORY_PATH
+# 股票代码格式：可选的sh/sz市场前缀 + 6位数字
+_CODE_RE = re.compile(r"^(sh|sz)?(\d{6})$", re.I)
+def _parse_symbol(stock_code: str) -> Optional[str]:
+    """校验股票代码并返回akshare所需的6位数字代码，格式无效时返回None"""
+    match = _CODE_RE.match(str(stock_code).strip())
+    return match.group(2) if match else None
+def _downcast_numeric(history_df: pd.DataFrame) -> None:
+    """将价格列转为float32、成交量转为最小可容纳的整型，原地修改"""
+    for col in ("open", "close", "high", "low"):
+        history_df[col] = pd.to_numeric(history_df[col], downcast="float")
+    history_df["volume"] = pd.to_numeric(history_df["volume"], downcast="integer")
+@st.cache_data(ttl=3600, show_spinner=False)
+def _fetch_history_cached(symbol: str, start: str, end: str) -> pd.DataFrame:
+    """
+    从akshare获取日线数据并统一格式，不涉及任何界面元素
+    相同代码与日期范围的重复查询直接命中缓存
+    """
+    history_df = ak.stock_zh_a_hist(
+        symbol=symbol,
+        period="daily",
+        start_date=start,
+        end_date=end
+    )
+    if history_df.empty:
+        return history_df
+    
+    # 重命名列以统一格式
+    history_df.rename(columns={
+        "日期": "date",
+        "开盘": "open",
+        "收盘": "close",
+        "最高": "high",
+        "最低": "low",
+        "成交量": "volume"
+    }, inplace=True)
+    
+    # 将日期转换为datetime类型并设置收盘时间为15:00
+    history_df['date'] = pd.to_datetime(history_df['date']) + pd.Timedelta(hours=15)
+    history_df.set_index("date", inplace=True)
+    
+    # 数值列向下转型，减少后续计算与缓存的内存占用
+    _downcast_numeric(history_df)
+    return history_df
 def fetch_stock_history(stock_code: Optional[str] = None) -> Optional[pd.DataFrame]:
     """
     获取股票历史数据
@@ -16,38 +60,26 @@ def fetch_stock_history(stock_code: Optional[str] = None) -> Optional[pd.DataFra
     """
     # 如果提供了股票代码，则直接获取数据
     if stock_code:
+        symbol = _parse_symbol(stock_code)
+        if symbol is None:
+            return None
         try:
             # 设置默认日期范围（最近120天）
             start_date = datetime.today() - timedelta(days=120)
             end_date = datetime.today()
             
             # 使用 akshare 获取数据
-            history_df = ak.stock_zh_a_hist(
-                symbol=stock_code.strip("shsz"),
-                period="daily",
-                start_date=start_date.strftime("%Y%m%d"),
-                end_date=end_date.strftime("%Y%m%d")
+            history_df = _fetch_history_cached(
+                symbol,
+                start_date.strftime("%Y%m%d"),
+                end_date.strftime("%Y%m%d")
             )
             
             if history_df.empty:
                 return None
                 
-            # 重命名列以统一格式
-            history_df.rename(columns={
-                "日期": "date",
-                "开盘": "open",
-                "收盘": "close",
-                "最高": "high",
-                "最低": "low",
-                "成交量": "volume"
-            }, inplace=True)
-            
-            # 将日期转换为datetime类型并设置收盘时间为15:00
-            history_df['date'] = pd.to_datetime(history_df['date']) + pd.Timedelta(hours=15)
-            history_df.set_index("date", inplace=True)
-            
-            # 保存到 CSV
-            history_df.to_csv(CSV_PATH)
+            # 保存到 Parquet（保留列类型与日期索引，读取无需再解析）
+            history_df.to_parquet(HISTORY_PATH, engine="pyarrow", compression="zstd")
             
             return history_df
             
@@ -66,36 +98,27 @@ def fetch_stock_history(stock_code: Optional[str] = None) -> Optional[pd.DataFra
             st.warning("请填写股票代码")
             return _load_cached_data()
         
+        symbol = _parse_symbol(stock_code)
+        if symbol is None:
+            st.error("股票代码格式无效，示例: sh600519 或 600519")
+            return _load_cached_data()
+        
         try:
             # 使用 akshare 获取数据
-            history_df = ak.stock_zh_a_hist(
-                symbol=stock_code.strip("shsz"),
-                period="daily",
-                start_date=start_date.strftime("%Y%m%d"),
-                end_date=end_date.strftime("%Y%m%d")
+            history_df = _fetch_history_cached(
+                symbol,
+                start_date.strftime("%Y%m%d"),
+                end_date.strftime("%Y%m%d")
             )
             
             if history_df.empty:
                 st.error("未获取到数据，请检查股票代码或日期范围。")
                 return _load_cached_data()
             
-            # 重命名列以统一格式
-            history_df.rename(columns={
-                "日期": "date",
-                "开盘": "open",
-                "收盘": "close",
-                "最高": "high",
-                "最低": "low",
-                "成交量": "volume"
-            }, inplace=True)
-            
-            # 将日期转换为datetime类型并设置收盘时间为15:00
-            history_df['date'] = pd.to_datetime(history_df['date']) + pd.Timedelta(hours=15)
-            history_df.set_index("date", inplace=True)
-            
-            # 保存到 CSV
-            history_df.to_csv(CSV_PATH)
+            # 保存到 Parquet（保留列类型与日期索引，读取无需再解析）
+            history_df.to_parquet(HISTORY_PATH, engine="pyarrow", compression="zstd")
             
+            st.session_state["history_df"] = history_df
             st.success("数据获取成功并已保存！")
             return history_df
             
@@ -103,13 +126,18 @@ def fetch_stock_history(stock_code: Optional[str] = None) -> Optional[pd.DataFra
             st.error(f"数据获取失败: {e}")
             return _load_cached_data()
     
+    # 未提交表单时优先返回本会话已获取的数据，避免每次重跑都重新读取
+    if "history_df" in st.session_state:
+        return st.session_state["history_df"]
+    
     # 默认加载缓存数据
     return _load_cached_data()
 def _load_cached_data() -> Optional[pd.DataFrame]:
     """加载本地缓存数据"""
-    if CSV_PATH.exists():
+    if HISTORY_PATH.exists():
         try:
-            df = pd.read_csv(CSV_PATH, index_col="date", parse_dates=True)
+            df = pd.read_parquet(HISTORY_PATH, engine="pyarrow")
+            st.session_state["history_df"] = df
             st.info("已加载本地缓存数据。")
             return df
         except Exception as e:
@@ -1,150 +1,432 @@
 import pandas as pd
+import numpy as np
 import akshare as ak
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import Callable, Iterator, List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import hashlib
+import os
+import shutil
+import sys
+import threading
 import time
 import random
 import logging
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import streamlit as st
+from config import CACHE_DIR
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def get_stock_basic_info() -> Optional[pd.DataFrame]:
+# 模拟数据保存目录
+SIM_DATA_DIR = "simulation_data"
+
+@st.cache_resource
+def _ensure_sim_data_dir() -> None:
+    """创建模拟数据保存目录；页面脚本每次重跑都会重新执行，借助cache_resource只在进程内创建一次"""
+    os.makedirs(SIM_DATA_DIR, exist_ok=True)
+
+_ensure_sim_data_dir()
+
+class _SessionRequests:
+    """代理requests模块：get/post走共享会话，其余属性（异常类等）原样透传"""
+    def __init__(self, session: requests.Session):
+        self._session = session
+    
+    def __getattr__(self, name):
+        return getattr(requests, name)
+    
+    def get(self, url, **kwargs):
+        return self._session.get(url, **kwargs)
+    
+    def post(self, url, **kwargs):
+        return self._session.post(url, **kwargs)
+
+@st.cache_resource
+def _install_shared_akshare_session() -> requests.Session:
     """
-    获取股票基本信息，包括股票代码、名称、行业等
+    为逐股K线接口安装进程级共享会话，并发获取K线时复用keep-alive连接
+    
+    stock_zh_a_hist所在模块直接调用requests.get，这里把该模块里的requests
+    替换为走共享会话的代理；连接池大小不小于并发获取的线程数。
+    财务指标接口自行创建requests.Session、实时行情接口经分页工具函数请求，
+    二者不经过模块级requests.get，替换无效，故不处理
     """
-    max_retries = 3
-    retry_delay = 3  # 重试间隔时间（秒）
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32,
+                          max_retries=Retry(total=3, backoff_factor=0.3))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
     
-    for retry in range(max_retries):
-        try:
-            logging.info(f"尝试获取股票基本信息 (第{retry+1}次)...")
-            # 获取所有A股基本信息
-            stock_basic_df = ak.stock_zh_a_spot_em()
-            
-            # 保留需要的列
-            stock_basic_df = stock_basic_df[[
-                '代码', '名称', '行业', '地区', '市盈率', '市净率', '换手率', '流通市值'
-            ]]
+    proxy = _SessionRequests(session)
+    module = sys.modules.get(ak.stock_zh_a_hist.__module__)
+    if getattr(module, 'requests', None) is requests:
+        module.requests = proxy
+    return session
+
+_install_shared_akshare_session()
+
+class _TokenBucket:
+    """线程安全的令牌桶限速器：每次真实网络请求前取一个令牌，令牌不足时等待补充"""
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+@st.cache_resource
+def _akshare_limiter() -> _TokenBucket:
+    """进程级共享的逐股请求限速器（每秒10次），缓存命中时不消耗令牌"""
+    return _TokenBucket(rate=10, capacity=10)
+
+_CACHE_DAY_LOCK = threading.Lock()
+_prepared_cache_day = None
+
+def _cache_day_dir(today: str):
+    """
+    返回当天的缓存子目录；每个进程每天首次调用时创建该目录，
+    并删除往日的目录（键中含日期，往日缓存不会再被读取）
+    """
+    global _prepared_cache_day
+    day_dir = CACHE_DIR / today
+    with _CACHE_DAY_LOCK:
+        if _prepared_cache_day != today:
+            day_dir.mkdir(exist_ok=True)
+            for entry in CACHE_DIR.iterdir():
+                if entry.name == today:
+                    continue
+                if entry.is_dir():
+                    shutil.rmtree(entry, ignore_errors=True)
+                else:
+                    entry.unlink(missing_ok=True)
+            _prepared_cache_day = today
+    return day_dir
+
+def _file_cached(ttl: int) -> Callable:
+    """
+    磁盘缓存装饰器：按(函数名, 参数, 当天日期)生成缓存文件，以Parquet格式存储
+    
+    缓存文件在ttl秒内有效；函数返回None（获取失败）时不写入缓存，
+    跨进程重启与多个会话共享；缓存按日期分目录存放，往日目录自动清理
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            today = datetime.today().strftime('%Y%m%d')
+            key = f"{func.__name__}:{args!r}:{sorted(kwargs.items())!r}:{today}"
+            cache_path = _cache_day_dir(today) / f"{hashlib.md5(key.encode('utf-8')).hexdigest()}.parquet"
             
-            # 重命名列
-            stock_basic_df.columns = [
-                'code', 'name', 'industry', 'region', 'pe', 'pb', 'turnover_rate', 'circulation_market_value'
-            ]
+            if cache_path.exists() and time.time() - cache_path.stat().st_mtime < ttl:
+                try:
+                    return pd.read_parquet(cache_path)
+                except Exception as e:
+                    logging.debug(f"读取缓存{cache_path.name}失败: {e}")
             
-            logging.info("股票基本信息获取成功")
-            return stock_basic_df
-        except Exception as e:
-            logging.error(f"获取股票基本信息失败: {e}")
-            if retry < max_retries - 1:
-                logging.info(f"{retry_delay}秒后重试...")
-                time.sleep(retry_delay)
-                retry_delay *= 2  # 指数退避
-                retry_delay += random.uniform(0, 1)  # 添加随机延迟避免并发问题
-            else:
-                logging.error("已达到最大重试次数，获取股票基本信息失败")
-                return None
+            result = func(*args, **kwargs)
+            if result is not None:
+                # 先写临时文件再原子替换，避免并发读取到写了一半的文件
+                tmp_path = cache_path.with_name(f"{cache_path.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+                try:
+                    result.to_parquet(tmp_path)
+                    os.replace(tmp_path, cache_path)
+                except Exception as e:
+                    logging.debug(f"写入缓存{cache_path.name}失败: {e}")
+                    tmp_path.unlink(missing_ok=True)
+            return result
+        return wrapper
+    return decorator
 
+def _with_retry(max_retries: int, retry_delay: float, max_delay: float = 8, log_level: int = logging.DEBUG) -> Callable:
+    """
+    重试装饰器：函数抛出异常时按指数退避加随机抖动重试，
+    全部失败后返回None
+    
+    参数:
+    - max_retries: 最大尝试次数
+    - retry_delay: 首次重试前的等待时间（秒），之后每次翻倍
+    - max_delay: 单次等待时间上限（秒）
+    - log_level: 失败日志的级别
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            for retry in range(max_retries):
+                try:
+                    return func(*args, **kwargs)
+                except Exception as e:
+                    logging.log(log_level, f"{func.__name__}{args!r} 第{retry+1}次失败: {e}")
+                    if retry < max_retries - 1:
+                        # 指数退避，并添加随机延迟避免并发请求同时重试
+                        time.sleep(min(retry_delay * 2 ** retry, max_delay) + random.uniform(0, 1))
+            logging.log(log_level, f"{func.__name__}{args!r} 已达到最大重试次数")
+            return None
+        return wrapper
+    return decorator
+
+@_file_cached(ttl=600)
+@_with_retry(max_retries=3, retry_delay=3, log_level=logging.ERROR)
+def get_stock_basic_info() -> Optional[pd.DataFrame]:
+    """
+    获取股票基本信息，包括股票代码、名称、行业等
+    """
+    logging.info("尝试获取股票基本信息...")
+    # 获取所有A股基本信息
+    stock_basic_df = ak.stock_zh_a_spot_em()
+    
+    # 保留需要的列
+    stock_basic_df = stock_basic_df[[
+        '代码', '名称', '行业', '地区', '市盈率', '市净率', '换手率', '流通市值'
+    ]]
+    
+    # 重命名列
+    stock_basic_df.columns = [
+        'code', 'name', 'industry', 'region', 'pe', 'pb', 'turnover_rate', 'circulation_market_value'
+    ]
+    
+    # 收窄类型：行业/地区重复度高用category，比率类指标用float32；
+    # 流通市值超出float32精度，保持原类型
+    stock_basic_df = stock_basic_df.astype({
+        'industry': 'category',
+        'region': 'category',
+        'pe': 'float32',
+        'pb': 'float32',
+        'turnover_rate': 'float32'
+    })
+    
+    logging.info("股票基本信息获取成功")
+    return stock_basic_df
+
+@_file_cached(ttl=86400)
+@_with_retry(max_retries=2, retry_delay=2)
 def get_financial_indicators(stock_code: str) -> Optional[pd.DataFrame]:
     """
     获取股票财务指标
     """
-    max_retries = 2
-    retry_delay = 2
+    logging.debug(f"获取{stock_code}财务指标...")
+    # 获取财务指标数据
+    _akshare_limiter().acquire()
+    financial_df = ak.stock_financial_analysis_indicator(stock_code)
     
-    for retry in range(max_retries):
-        try:
-            logging.debug(f"获取{stock_code}财务指标 (第{retry+1}次)...")
-            # 获取财务指标数据
-            financial_df = ak.stock_financial_analysis_indicator(stock_code)
-            
-            # 取最新一期数据
-            latest_financial = financial_df.iloc[0].to_frame().T
-            
-            return latest_financial
-        except Exception as e:
-            logging.debug(f"获取{stock_code}财务指标失败: {e}")
-            if retry < max_retries - 1:
-                time.sleep(retry_delay)
+    # 取最新一期数据（保留原列类型的1行DataFrame）
+    return financial_df.iloc[:1]
+
+def get_financial_indicators_bulk(stock_codes: List[str], max_workers: int = 16) -> Dict[str, Optional[pd.DataFrame]]:
+    """
+    并发获取多只股票的财务指标
+    
+    单只股票失败重试时只占用一个工作线程，不会阻塞其他股票的请求
     
-    return None
+    返回:
+    - 股票代码到最新一期财务指标的映射，获取失败的为None
+    """
+    codes = list(dict.fromkeys(stock_codes))
+    if not codes:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(codes))) as executor:
+        return dict(zip(codes, executor.map(get_financial_indicators, codes)))
 
+def _add_moving_averages(k_data: pd.DataFrame, windows=(5, 20, 60)) -> None:
+    """
+    基于一次累加和计算多条收盘价均线，原地写入ma{N}列
+    
+    与rolling(window=N).mean()结果一致：数据不足N天或窗口内含NaN的位置为NaN
+    （NaN按0累加并单独统计有效值个数，单个缺失值不会影响之后的窗口）
+    """
+    closes = k_data['close'].to_numpy(dtype=float)
+    csum = np.concatenate(([0.0], np.nancumsum(closes)))
+    valid_count = np.concatenate(([0], np.cumsum(~np.isnan(closes))))
+    for window in windows:
+        ma = np.full(len(closes), np.nan)
+        if len(closes) >= window:
+            window_sum = csum[window:] - csum[:-window]
+            full = (valid_count[window:] - valid_count[:-window]) == window
+            ma[window - 1:] = np.where(full, window_sum / window, np.nan)
+        k_data[f'ma{window}'] = ma
+
+@_file_cached(ttl=86400)
 def get_stock_k_data(stock_code: str, days: int = 120) -> Optional[pd.DataFrame]:
     """
     获取股票K线数据
     """
-    max_retries = 2
-    retry_delay = 2
+    # 日期与代码在重试之间不变，只计算一次
+    today = datetime.today()
+    return _fetch_k_data(
+        stock_code.strip("shsz"),
+        (today - timedelta(days=days)).strftime("%Y%m%d"),
+        today.strftime("%Y%m%d")
+    )
+
+@_with_retry(max_retries=2, retry_delay=2)
+def _fetch_k_data(symbol: str, start_date: str, end_date: str) -> pd.DataFrame:
+    """
+    请求指定区间的日K线并计算均线，失败时由装饰器重试
+    """
+    logging.debug(f"获取{symbol}K线数据...")
+    # 获取K线数据
+    _akshare_limiter().acquire()
+    k_data = ak.stock_zh_a_hist(
+        symbol=symbol,
+        period="daily",
+        start_date=start_date,
+        end_date=end_date
+    )
     
-    for retry in range(max_retries):
-        try:
-            end_date = datetime.today().strftime("%Y%m%d")
-            start_date = (datetime.today() - timedelta(days=days)).strftime("%Y%m%d")
-            
-            logging.debug(f"获取{stock_code}K线数据 (第{retry+1}次)...")
-            # 获取K线数据
-            k_data = ak.stock_zh_a_hist(
-                symbol=stock_code.strip("shsz"),
-                period="daily",
-                start_date=start_date,
-                end_date=end_date
-            )
-            
-            # 重命名列
-            k_data.rename(columns={
-                "日期": "date",
-                "开盘": "open",
-                "收盘": "close",
-                "最高": "high",
-                "最低": "low",
-                "成交量": "volume"
-            }, inplace=True)
-            
-            # 计算技术指标
-            k_data['ma5'] = k_data['close'].rolling(window=5).mean()
-            k_data['ma20'] = k_data['close'].rolling(window=20).mean()
-            k_data['ma60'] = k_data['close'].rolling(window=60).mean()
-            
-            return k_data
-        except Exception as e:
-            logging.debug(f"获取{stock_code}K线数据失败: {e}")
-            if retry < max_retries - 1:
-                time.sleep(retry_delay)
+    # 重命名列
+    k_data.rename(columns={
+        "日期": "date",
+        "开盘": "open",
+        "收盘": "close",
+        "最高": "high",
+        "最低": "low",
+        "成交量": "volume"
+    }, inplace=True)
+    
+    # 计算技术指标
+    _add_moving_averages(k_data)
     
-    return None
+    return k_data
+
+def _iter_k_data(stock_codes: List[str], days: int = 120, max_workers: int = 8) -> Iterator[Optional[pd.DataFrame]]:
+    """
+    并发获取多只股票的K线数据，按输入顺序逐只产出结果
+    
+    按批次提交请求（每批max_workers*2只），调用方提前结束遍历时
+    只会等待当前批次完成，不会把剩余股票全部请求一遍
+    """
+    batch_size = max_workers * 2
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for start in range(0, len(stock_codes), batch_size):
+            batch = stock_codes[start:start + batch_size]
+            yield from executor.map(lambda code: get_stock_k_data(code, days=days), batch)
 
 def calculate_technical_indicators(k_data: pd.DataFrame) -> Dict[str, float]:
     """
     计算技术指标
     """
-    # 确保数据按日期排序
-    k_data = k_data.sort_values('date')
-    
-    # 计算均线关系
-    latest_data = k_data.iloc[-1]
+    # get_stock_k_data返回的数据已按日期升序排列，无需再排序
+    # 直接在底层数组上取值，避免逐次.iloc构建整行Series
+    closes = k_data['close'].to_numpy()
+    latest_close = closes[-1]
+    ma5 = k_data['ma5'].to_numpy()[-1]
+    ma20 = k_data['ma20'].to_numpy()[-1]
+    ma60 = k_data['ma60'].to_numpy()[-1]
     
     # 均线多头排列判断（短期均线上穿长期均线）
-    is_ma_bullish = latest_data['ma5'] > latest_data['ma20'] > latest_data['ma60']
+    is_ma_bullish = ma5 > ma20 > ma60
     
     # 计算价格趋势（最近20天涨幅）
-    if len(k_data) >= 20:
-        price_trend = (latest_data['close'] - k_data.iloc[-20]['close']) / k_data.iloc[-20]['close'] * 100
+    if len(closes) >= 20:
+        price_trend = (latest_close - closes[-20]) / closes[-20] * 100
     else:
         price_trend = 0
     
     return {
         'is_ma_bullish': is_ma_bullish,
         'price_trend': price_trend,
-        'latest_close': latest_data['close'],
-        'ma5': latest_data['ma5'],
-        'ma20': latest_data['ma20'],
-        'ma60': latest_data['ma60']
+        'latest_close': latest_close,
+        'ma5': ma5,
+        'ma20': ma20,
+        'ma60': ma60
     }
 
+# 选股结果列：两种模式分别输出的列及其顺序
+_PRICE_TREND_COLUMNS = ['code', 'name', 'industry', 'pe', 'pb', 'turnover_rate', 'circulation_market_value',
+                        'price_trend', 'price_trend_days', 'latest_close']
+_COMPREHENSIVE_COLUMNS = ['code', 'name', 'industry', 'pe', 'pb', 'turnover_rate', 'circulation_market_value',
+                          'price_trend', 'latest_close', 'ma5', 'ma20', 'ma60']
+
+# 模拟数据的随机数生成器：页面脚本每次重跑都会重新创建，不在会话线程间共享
+_RNG = np.random.default_rng()
+
+def _with_industry(df: pd.DataFrame) -> pd.DataFrame:
+    """缺少行业列时补为“未知”"""
+    return df if 'industry' in df else df.assign(industry='未知')
+
+def _simulated_quotes(df: pd.DataFrame):
+    """
+    取模拟数据中的最新收盘价与涨幅列，缺失时用随机值补齐
+    
+    返回:
+    - (latest_close, price_trend) 两个与df等长的数组
+    """
+    n = len(df)
+    if 'latest_close' in df:
+        latest_close = df['latest_close'].to_numpy(dtype=float)
+    else:
+        latest_close = _RNG.uniform(2, 300, n)
+    if 'price_trend' in df:
+        price_trend = df['price_trend'].to_numpy(dtype=float)
+    else:
+        price_trend = _RNG.uniform(-10, 30, n)
+    return latest_close, price_trend
+
+def _build_selection(source: pd.DataFrame, positions: List[int], columns: List[str], **computed) -> pd.DataFrame:
+    """
+    按行位置从源表中取出选中的股票，并附加逐只计算出的指标列
+    """
+    return _with_industry(source.iloc[positions]).assign(**computed)[columns]
+
+def _select_simulated_price_trend(basic_info: pd.DataFrame, limit: int, price_trend_days: int,
+                                  price_trend_min: float, price_trend_max: float) -> pd.DataFrame:
+    """
+    简单涨幅模式下的模拟数据选股：整列一次性计算涨幅掩码
+    
+    与逐行遍历的语义一致：按原顺序取前limit只满足条件的股票
+    """
+    latest_close, price_trend = _simulated_quotes(basic_info)
+    candidates = _with_industry(basic_info).assign(
+        price_trend=price_trend,
+        price_trend_days=price_trend_days,
+        latest_close=latest_close
+    )
+    
+    # 涨幅筛选条件
+    mask = (price_trend >= price_trend_min) & (price_trend <= price_trend_max)
+    return candidates.loc[mask, _PRICE_TREND_COLUMNS].head(limit)
+
+def _select_simulated_comprehensive(filtered_basic: pd.DataFrame, limit: int) -> pd.DataFrame:
+    """
+    综合模式下的模拟数据选股：整表一次性生成模拟技术指标并按掩码筛选
+    
+    与逐行遍历的语义一致：按原顺序取前limit只满足条件的股票
+    """
+    n = len(filtered_basic)
+    latest_close, price_trend = _simulated_quotes(filtered_basic)
+    
+    # 模拟技术指标
+    is_ma_bullish = _RNG.random(n) < 0.5
+    candidates = _with_industry(filtered_basic).assign(
+        price_trend=price_trend,
+        latest_close=latest_close,
+        ma5=latest_close * _RNG.uniform(0.95, 1.05, n),
+        ma20=latest_close * _RNG.uniform(0.9, 1.1, n),
+        ma60=latest_close * _RNG.uniform(0.85, 1.15, n)
+    )
+    
+    # 技术面筛选条件
+    mask = is_ma_bullish & (price_trend > 0)
+    return candidates.loc[mask, _COMPREHENSIVE_COLUMNS].head(limit)
+
 def select_stocks(basic_info: pd.DataFrame, limit: int = 10, selection_mode: str = 'comprehensive', 
                   price_trend_days: int = 20, price_trend_min: float = 0, price_trend_max: float = 100, 
-                  pe_min: float = 0, pe_max: float = 30, pb_max: float = 5, market_cap_min: float = 1000000000) -> List[Dict]:
+                  pe_min: float = 0, pe_max: float = 30, pb_max: float = 5, market_cap_min: float = 1000000000) -> pd.DataFrame:
     """
     选股函数
     
@@ -159,147 +441,119 @@ def select_stocks(basic_info: pd.DataFrame, limit: int = 10, selection_mode: str
     - pe_max: 最大市盈率
     - pb_max: 最大市净率
     - market_cap_min: 最小流通市值
+    
+    返回:
+    - 选中股票的DataFrame，列见_PRICE_TREND_COLUMNS / _COMPREHENSIVE_COLUMNS
     """
-    selected_stocks = []
     processed_count = 0
     
-    # 判断是否使用模拟数据（通过检查是否存在于session_state）
-    is_using_simulated_data = False
-    if hasattr(st.session_state, 'simulated_data') and basic_info.equals(st.session_state['simulated_data']):
-        is_using_simulated_data = True
+    # 判断是否使用模拟数据：会话中的模拟数据不会被原地修改，直接比较对象身份即可
+    is_using_simulated_data = basic_info is st.session_state.get('simulated_data')
+    if is_using_simulated_data:
         logging.info("检测到使用模拟数据进行选股")
     
     if selection_mode == 'price_trend':
         # 简单涨幅模式：只基于涨幅筛选
         logging.info("使用简单涨幅模式选股")
         
-        # 遍历所有股票
-        for _, stock in basic_info.iterrows():
-            processed_count += 1
-            if processed_count % 10 == 0:
-                logging.info(f"已处理{processed_count}只股票，当前选中{len(selected_stocks)}只")
+        if is_using_simulated_data:
+            # 模拟数据无需网络请求，直接整列向量化筛选
+            selected_stocks = _select_simulated_price_trend(
+                basic_info, limit, price_trend_days, price_trend_min, price_trend_max)
+            processed_count = len(basic_info)
+        else:
+            # 真实数据：并发预取K线（确保有足够的数据），与遍历顺序一一对应
+            k_data_iter = _iter_k_data(
+                basic_info['code'].tolist(), days=price_trend_days + 5)
             
-            stock_code = stock['code']
+            # 只记录选中股票的行位置和计算出的指标，遍历结束后从源表一次性取出
+            positions, trends, latest_closes = [], [], []
             
-            if is_using_simulated_data:
-                # 直接使用模拟数据中的信息
-                latest_close = stock.get('latest_close', random.uniform(2, 300))
-                price_trend = stock.get('price_trend', random.uniform(-10, 30))
-            else:
+            # 遍历所有股票
+            for pos, k_data in enumerate(k_data_iter):
+                processed_count += 1
+                if processed_count % 10 == 0:
+                    logging.info(f"已处理{processed_count}只股票，当前选中{len(positions)}只")
+                
                 # 获取技术面数据
-                k_data = get_stock_k_data(stock_code, days=price_trend_days + 5)  # 确保有足够的数据
                 if k_data is None or len(k_data) < price_trend_days:
                     continue
                 
-                # 计算指定周期内的涨幅
-                latest_close = k_data.iloc[-1]['close']
-                if len(k_data) >= price_trend_days:
-                    past_close = k_data.iloc[-price_trend_days]['close']
-                    price_trend = (latest_close - past_close) / past_close * 100
-                else:
-                    continue
-            
-            # 涨幅筛选条件
-            if price_trend_min <= price_trend <= price_trend_max:
-                # 构建选股结果
-                stock_info = {
-                    'code': stock['code'],
-                    'name': stock['name'],
-                    'industry': stock.get('industry', '未知'),
-                    'pe': stock['pe'],
-                    'pb': stock['pb'],
-                    'turnover_rate': stock['turnover_rate'],
-                    'circulation_market_value': stock['circulation_market_value'],
-                    'price_trend': price_trend,
-                    'price_trend_days': price_trend_days,
-                    'latest_close': latest_close
-                }
-                
-                selected_stocks.append(stock_info)
+                # 计算指定周期内的涨幅，直接在收盘价数组上取值，避免整行装箱
+                closes = k_data['close'].to_numpy()
+                latest_close = closes[-1]
+                past_close = closes[-price_trend_days]
+                price_trend = (latest_close - past_close) / past_close * 100
                 
-                # 达到选股数量限制
-                if len(selected_stocks) >= limit:
-                    break
+                # 涨幅筛选条件
+                if price_trend_min <= price_trend <= price_trend_max:
+                    positions.append(pos)
+                    trends.append(price_trend)
+                    latest_closes.append(latest_close)
+                    
+                    # 达到选股数量限制
+                    if len(positions) >= limit:
+                        break
             
-            # 仅当使用真实数据时添加延迟
-            if not is_using_simulated_data:
-                time.sleep(0.1)
+            # 构建选股结果
+            selected_stocks = _build_selection(
+                basic_info, positions, _PRICE_TREND_COLUMNS,
+                price_trend=trends, price_trend_days=price_trend_days, latest_close=latest_closes)
         
         # 按涨幅排序
-        selected_stocks.sort(key=lambda x: x['price_trend'], reverse=True)
+        selected_stocks = selected_stocks.sort_values('price_trend', ascending=False, kind='stable', ignore_index=True)
     
     else:
         # 综合模式：基于基本面和技术面指标
         logging.info("使用综合模式选股")
         
-        # 基本面筛选条件
-        filtered_basic = basic_info[
-            (basic_info['pe'] > pe_min) & (basic_info['pe'] < pe_max) &
-            (basic_info['pb'] < pb_max) &
-            (basic_info['circulation_market_value'] > market_cap_min)
-        ]
+        # 基本面筛选条件：query在安装了numexpr时会合并为一次向量化计算，否则回退到普通求值
+        filtered_basic = basic_info.query(
+            'pe > @pe_min and pe < @pe_max and pb < @pb_max and circulation_market_value > @market_cap_min'
+        )
         
         logging.info(f"基本面筛选后剩余{len(filtered_basic)}只股票")
         
-        # 遍历筛选后的股票
-        for _, stock in filtered_basic.iterrows():
-            processed_count += 1
-            if processed_count % 10 == 0:
-                logging.info(f"已处理{processed_count}只股票，当前选中{len(selected_stocks)}只")
+        if is_using_simulated_data:
+            # 模拟数据无需网络请求，直接整表向量化筛选
+            selected_stocks = _select_simulated_comprehensive(filtered_basic, limit)
+            processed_count = len(filtered_basic)
+        else:
+            # 真实数据：并发预取K线，与遍历顺序一一对应
+            k_data_iter = _iter_k_data(filtered_basic['code'].tolist())
             
-            stock_code = stock['code']
+            # 只记录选中股票的行位置和技术指标，遍历结束后从源表一次性取出
+            positions = []
+            indicators = {key: [] for key in ('price_trend', 'latest_close', 'ma5', 'ma20', 'ma60')}
             
-            if is_using_simulated_data:
-                # 使用模拟数据中的信息
-                latest_close = stock.get('latest_close', random.uniform(2, 300))
-                price_trend = stock.get('price_trend', random.uniform(-10, 30))
-                # 模拟技术指标
-                technical_indicators = {
-                    'is_ma_bullish': random.choice([True, False]),
-                    'price_trend': price_trend,
-                    'latest_close': latest_close,
-                    'ma5': latest_close * random.uniform(0.95, 1.05),
-                    'ma20': latest_close * random.uniform(0.9, 1.1),
-                    'ma60': latest_close * random.uniform(0.85, 1.15)
-                }
-            else:
+            # 遍历筛选后的股票
+            for pos, k_data in enumerate(k_data_iter):
+                processed_count += 1
+                if processed_count % 10 == 0:
+                    logging.info(f"已处理{processed_count}只股票，当前选中{len(positions)}只")
+                
                 # 获取技术面数据
-                k_data = get_stock_k_data(stock_code)
                 if k_data is None or len(k_data) < 60:
                     continue
                 
                 # 计算技术指标
                 technical_indicators = calculate_technical_indicators(k_data)
-            
-            # 技术面筛选条件
-            if technical_indicators['is_ma_bullish'] and technical_indicators['price_trend'] > 0:
-                # 构建选股结果
-                stock_info = {
-                    'code': stock['code'],
-                    'name': stock['name'],
-                    'industry': stock.get('industry', '未知'),
-                    'pe': stock['pe'],
-                    'pb': stock['pb'],
-                    'turnover_rate': stock['turnover_rate'],
-                    'circulation_market_value': stock['circulation_market_value'],
-                    'price_trend': technical_indicators['price_trend'],
-                    'latest_close': technical_indicators['latest_close'],
-                    'ma5': technical_indicators['ma5'],
-                    'ma20': technical_indicators['ma20'],
-                    'ma60': technical_indicators['ma60']
-                }
                 
-                selected_stocks.append(stock_info)
-                
-                # 达到选股数量限制
-                if len(selected_stocks) >= limit:
-                    break
+                # 技术面筛选条件
+                if technical_indicators['is_ma_bullish'] and technical_indicators['price_trend'] > 0:
+                    positions.append(pos)
+                    for key, values in indicators.items():
+                        values.append(technical_indicators[key])
+                    
+                    # 达到选股数量限制
+                    if len(positions) >= limit:
+                        break
             
-            # 添加小延迟避免请求过快
-            time.sleep(0.1)
+            # 构建选股结果
+            selected_stocks = _build_selection(filtered_basic, positions, _COMPREHENSIVE_COLUMNS, **indicators)
         
         # 按流通市值排序
-        selected_stocks.sort(key=lambda x: x['circulation_market_value'], reverse=True)
+        selected_stocks = selected_stocks.sort_values('circulation_market_value', ascending=False, kind='stable', ignore_index=True)
     
     logging.info(f"共处理{processed_count}只股票，最终选中{len(selected_stocks)}只")
     
@@ -340,26 +594,33 @@ def generate_stock_selection_report(limit: int = 10, selection_mode: str = 'comp
     
     # 选股
     logging.info("开始选股...")
-    selected_stocks = select_stocks(basic_info, limit=limit, selection_mode=selection_mode,
-                                  price_trend_days=price_trend_days, price_trend_min=price_trend_min, price_trend_max=price_trend_max,
-                                  pe_min=pe_min, pe_max=pe_max, pb_max=pb_max, market_cap_min=market_cap_min)
-    
-    # 转换为DataFrame
-    report_df = pd.DataFrame(selected_stocks)
+    # select_stocks直接返回DataFrame，无需再由字典列表转换
+    report_df = select_stocks(basic_info, limit=limit, selection_mode=selection_mode,
+                              price_trend_days=price_trend_days, price_trend_min=price_trend_min, price_trend_max=price_trend_max,
+                              pe_min=pe_min, pe_max=pe_max, pb_max=pb_max, market_cap_min=market_cap_min)
     
     logging.info(f"选股报告生成完成，共选中{len(report_df)}只股票")
     
     # 保存选股结果到CSV文件，以便main.py可以访问
     if not report_df.empty:
+        # 只序列化一次，两个文件写入同一份字节
+        csv_bytes = report_df.to_csv(index=False).encode("utf-8-sig")
         csv_path = f"selected_stocks_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        report_df.to_csv(csv_path, index=False)
+        with open(csv_path, "wb") as f:
+            f.write(csv_bytes)
         logging.info(f"选股结果已保存到{csv_path}文件")
         
         # 同时保存到分析工具需要的文件
-        report_df.to_csv("selected_stocks_for_analysis.csv", index=False, encoding="utf-8-sig")
+        with open("selected_stocks_for_analysis.csv", "wb") as f:
+            f.write(csv_bytes)
     
     return report_df
 
+@st.cache_data(ttl=5, show_spinner=False)
+def _list_saved_simulations() -> List[str]:
+    """列出已保存的模拟数据文件"""
+    return sorted(f for f in os.listdir(SIM_DATA_DIR) if f.endswith(".csv"))
+
 def main():
     """
     Streamlit应用入口函数
@@ -380,42 +641,29 @@ def main():
             
             # 生成模拟数据按钮
             if st.button("生成模拟数据"):
-                
-                
-                # 模拟股票代码和名称
-                stock_codes = []
-                stock_names = []
-                stock_industries = []
+                n = int(sim_stock_count)
                 
                 # 股票行业类别
                 industries = ["银行", "科技", "医药", "消费", "能源", "地产", "制造", "传媒", "互联网", "通信"]
+                companies = ["中国", "华夏", "东方", "南方", "北方", "西部", "联合", "国际", "环球", "全球"]
+                type_names = ["科技", "发展", "创新", "投资", "控股", "集团", "股份", "有限", "实业", "产业"]
                 
-                for i in range(sim_stock_count):
-                    # 随机生成股票代码
-                    market = random.choice(["sh", "sz"])
-                    code = market + str(random.randint(100000, 999999)).zfill(6)
-                    stock_codes.append(code)
-                    
-                    # 随机选择行业
-                    industry = random.choice(industries)
-                    stock_industries.append(industry)
-                    
-                    # 随机生成股票名称
-                    company = random.choice(["中国", "华夏", "东方", "南方", "北方", "西部", "联合", "国际", "环球", "全球"])
-                    type_name = random.choice(["科技", "发展", "创新", "投资", "控股", "集团", "股份", "有限", "实业", "产业"])
-                    stock_names.append(f"{company}{industry}{type_name}")
+                # 模拟股票代码和名称（整列一次性生成）
+                stock_codes = np.char.add(_RNG.choice(["sh", "sz"], n), _RNG.integers(100000, 1000000, n).astype(str))
+                stock_industries = _RNG.choice(industries, n)
+                stock_names = np.char.add(np.char.add(_RNG.choice(companies, n), stock_industries), _RNG.choice(type_names, n))
                 
                 # 生成模拟财务和市场数据
                 sim_data = {
                     "code": stock_codes,
                     "name": stock_names,
                     "industry": stock_industries,
-                    "pe": [round(random.uniform(5, 30), 2) for _ in range(sim_stock_count)],  # 市盈率5-30
-                    "pb": [round(random.uniform(0.5, 5), 2) for _ in range(sim_stock_count)],  # 市净率0.5-5
-                    "turnover_rate": [round(random.uniform(0.1, 5), 2) for _ in range(sim_stock_count)],  # 换手率0.1-5%
-                    "circulation_market_value": [random.randint(5000000000, 500000000000) for _ in range(sim_stock_count)],  # 流通市值50亿-5000亿
-                    "latest_close": [round(random.uniform(2, 300), 2) for _ in range(sim_stock_count)],  # 收盘价2-300元
-                    "price_trend": [round(random.uniform(-10, 30), 2) for _ in range(sim_stock_count)]  # 涨幅-10%到30%
+                    "pe": np.round(_RNG.uniform(5, 30, n), 2),  # 市盈率5-30
+                    "pb": np.round(_RNG.uniform(0.5, 5, n), 2),  # 市净率0.5-5
+                    "turnover_rate": np.round(_RNG.uniform(0.1, 5, n), 2),  # 换手率0.1-5%
+                    "circulation_market_value": _RNG.integers(5000000000, 500000000001, n),  # 流通市值50亿-5000亿
+                    "latest_close": np.round(_RNG.uniform(2, 300, n), 2),  # 收盘价2-300元
+                    "price_trend": np.round(_RNG.uniform(-10, 30, n), 2)  # 涨幅-10%到30%
                 }
                 
                 sim_df = pd.DataFrame(sim_data)
@@ -435,19 +683,15 @@ def main():
                 # 保存模拟数据
                 st.subheader("保存模拟数据")
                 
-                # 创建模拟数据保存目录
-                import os
-                sim_data_dir = "simulation_data"
-                if not os.path.exists(sim_data_dir):
-                    os.makedirs(sim_data_dir)
-                
                 # 保存文件名输入
                 save_name = st.text_input("保存文件名", value="模拟数据_" + datetime.now().strftime("%Y%m%d_%H%M%S"))
                 
                 if st.button("保存当前模拟数据"):
                     # 保存到文件
-                    save_path = os.path.join(sim_data_dir, f"{save_name}.csv")
+                    save_path = os.path.join(SIM_DATA_DIR, f"{save_name}.csv")
                     sim_df.to_csv(save_path, index=False, encoding="utf-8-sig")
+                    # 新文件立即出现在加载列表中
+                    _list_saved_simulations.clear()
                     st.success(f"模拟数据已保存到：{save_path}")
                 
                 # 使用expander展示所有模拟数据
@@ -466,35 +710,29 @@ def main():
             # 加载保存的模拟数据
             st.subheader("加载保存的模拟数据")
             
-            # 检查是否有保存的模拟数据
-            import os
-            sim_data_dir = "simulation_data"
-            if os.path.exists(sim_data_dir):
-                # 获取所有保存的模拟数据文件
-                saved_files = [f for f in os.listdir(sim_data_dir) if f.endswith(".csv")]
+            # 获取所有保存的模拟数据文件（短时缓存，不在每次重跑时扫描目录）
+            saved_files = _list_saved_simulations()
+            
+            if saved_files:
+                # 选择要加载的文件
+                selected_file = st.selectbox("选择要加载的模拟数据", saved_files)
                 
-                if saved_files:
-                    # 选择要加载的文件
-                    selected_file = st.selectbox("选择要加载的模拟数据", saved_files)
+                if st.button("加载选中的模拟数据"):
+                    # 加载数据
+                    load_path = os.path.join(SIM_DATA_DIR, selected_file)
+                    loaded_df = pd.read_csv(load_path, encoding="utf-8-sig")
                     
-                    if st.button("加载选中的模拟数据"):
-                        # 加载数据
-                        load_path = os.path.join(sim_data_dir, selected_file)
-                        loaded_df = pd.read_csv(load_path, encoding="utf-8-sig")
-                        
-                        # 保存到会话状态
-                        st.session_state["simulated_data"] = loaded_df
-                        
-                        # 同时保存到分析工具需要的文件
-                        loaded_df.to_csv("selected_stocks_for_analysis.csv", index=False, encoding="utf-8-sig")
-                        
-                        st.success(f"已加载模拟数据：{selected_file}（共{len(loaded_df)}只股票）")
-                        
-                        # 显示加载的数据
-                        with st.expander("查看加载的模拟数据", expanded=True):
-                            st.dataframe(loaded_df, use_container_width=True)
-                else:
-                    st.info("还没有保存的模拟数据")
+                    # 保存到会话状态
+                    st.session_state["simulated_data"] = loaded_df
+                    
+                    # 同时保存到分析工具需要的文件
+                    loaded_df.to_csv("selected_stocks_for_analysis.csv", index=False, encoding="utf-8-sig")
+                    
+                    st.success(f"已加载模拟数据：{selected_file}（共{len(loaded_df)}只股票）")
+                    
+                    # 显示加载的数据
+                    with st.expander("查看加载的模拟数据", expanded=True):
+                        st.dataframe(loaded_df, use_container_width=True)
             else:
                 st.info("还没有保存的模拟数据")
         
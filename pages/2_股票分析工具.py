@@ -3,11 +3,26 @@ import pandas as pd
 from datetime import datetime, timedelta
 from pathlib import Path
 import os
-from config import CSV_PATH, DATA_DIR
+from config import HISTORY_PATH, DATA_DIR
 from data_fetcher import fetch_stock_history
 from calculator import calculate_pe_ratio
 from predictor import FinancialPredictor
 from visualizer import plot_stock_data, plot_pe_analysis
+@st.cache_data(ttl=300, show_spinner=False)
+def _load_selected_stocks(path: str, mtime: float) -> pd.DataFrame:
+    """
+    读取选股结果；文件修改时间作为缓存键的一部分，文件更新后自动重新读取
+    股票代码按字符串读取以保留前导零（pyarrow引擎会先推断为整数再转换，前导零丢失，故使用默认引擎）
+    """
+    return pd.read_csv(path, dtype={"code": str})
+@st.cache_data(ttl=3600, show_spinner=False)
+def _run_forecasts(pe_series: pd.Series, forecast_quarters: int, price_series: pd.Series,
+                   forecast_days: int, forecast_type: str, model_type: str = "random_forest"):
+    """
+    训练模型并预测市盈率与股价；按输入序列与参数缓存，页面重跑时不重复训练
+    """
+    predictor = FinancialPredictor(model_type=model_type)
+    return predictor.predict_batch(pe_series, forecast_quarters, price_series, forecast_days, forecast_type)
 def main():
     st.title("股票数据分析工具")
     
@@ -36,10 +51,8 @@ def main():
             # 3. 预测未来市盈率
             st.header("3. 市盈率预测")
             forecast_quarters = st.slider("预测季度数", min_value=1, max_value=8, value=2)
-            predictor = FinancialPredictor(model_type="random_forest")
-            forecast_df, metrics = predictor.predict_pe(pe_df['PE'], forecast_quarters)
-            st.subheader("预测结果")
-            st.dataframe(forecast_df)
+            # 先占位，待两个模型并发训练完成后再填入市盈率预测结果
+            pe_forecast_slot = st.container()
             
             # 4. 股价预测
             st.header("4. 股价预测")
@@ -49,7 +62,10 @@ def main():
                 ["daily", "quarterly"],
                 index=0
             )
-            price_forecast_df, price_metrics = predictor.predict_stock_price(stock_history_df['close'], forecast_days, forecast_type)
+            (forecast_df, metrics), (price_forecast_df, price_metrics) = _run_forecasts(
+                pe_df['PE'], forecast_quarters, stock_history_df['close'], forecast_days, forecast_type)
+            pe_forecast_slot.subheader("预测结果")
+            pe_forecast_slot.dataframe(forecast_df)
             st.subheader("股价预测结果")
             st.dataframe(price_forecast_df)
             
@@ -67,7 +83,7 @@ def main():
         selected_stocks_file = "selected_stocks_for_analysis.csv"
         if os.path.exists(selected_stocks_file):
             # 读取选股结果
-            selected_stocks_df = pd.read_csv(selected_stocks_file)
+            selected_stocks_df = _load_selected_stocks(selected_stocks_file, os.path.getmtime(selected_stocks_file))
             
             if not selected_stocks_df.empty:
                 st.success(f"已加载选股结果，共{len(selected_stocks_df)}只股票")
@@ -83,8 +99,9 @@ def main():
                     index=0
                 )
                 
-                # 获取选中股票的代码
-                stock_code = selected_stocks_df[selected_stocks_df["name"] == selected_stock]["code"].values[0]
+                # 获取选中股票的信息与代码（只筛选一次）
+                stock_info = selected_stocks_df[selected_stocks_df["name"] == selected_stock].iloc[0]
+                stock_code = stock_info["code"]
                 
                 # 获取该股票的历史数据
                 with st.spinner(f"正在获取{selected_stock}的历史数据..."):
@@ -100,7 +117,6 @@ def main():
                     if pe_df is not None and not pe_df.empty:
                         # 显示股票基本信息
                         st.subheader(f"{selected_stock} ({stock_code}) 基本信息")
-                        stock_info = selected_stocks_df[selected_stocks_df["name"] == selected_stock].iloc[0]
                         info_cols = st.columns(2)
                         with info_cols[0]:
                             st.metric("市盈率", f"{stock_info['pe']:.2f}")
@@ -118,9 +134,8 @@ def main():
                         # 预测未来市盈率
                         st.subheader("市盈率预测")
                         forecast_quarters = st.slider("预测季度数", min_value=1, max_value=8, value=2, key="forecast_quarters")
-                        predictor = FinancialPredictor(model_type="random_forest")
-                        forecast_df, metrics = predictor.predict_pe(pe_df['PE'], forecast_quarters)
-                        st.dataframe(forecast_df, use_container_width=True)
+                        # 先占位，待两个模型并发训练完成后再填入市盈率预测结果
+                        pe_forecast_slot = st.container()
                         
                         # 股价预测
                         st.subheader("股价预测")
@@ -131,7 +146,9 @@ def main():
                             index=0,
                             key="price_forecast_type"
                         )
-                        price_forecast_df, price_metrics = predictor.predict_stock_price(stock_history_df['close'], forecast_days, forecast_type)
+                        (forecast_df, metrics), (price_forecast_df, price_metrics) = _run_forecasts(
+                            pe_df['PE'], forecast_quarters, stock_history_df['close'], forecast_days, forecast_type)
+                        pe_forecast_slot.dataframe(forecast_df, use_container_width=True)
                         st.subheader("股价预测结果")
                         st.dataframe(price_forecast_df, use_container_width=True)
                         
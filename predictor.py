@@ -1,6 +1,10 @@
+import os
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter, lfiltic
 from typing import Tuple, Dict, List
+from concurrent.futures import ThreadPoolExecutor
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.linear_model import LinearRegression
 from sklearn.metrics import mean_absolute_error, r2_score
@@ -16,6 +20,7 @@ class FinancialPredictor:
         self.model_type = model_type
         self.model = None
         self.sequence_length = 4  # 使用4个季度的历史数据进行预测
+        self.n_jobs = -1  # 随机森林建树的并行线程数，-1表示使用全部CPU核心
     
     def _create_sequences(self, data: pd.Series, seq_length: int) -> Tuple[np.ndarray, np.ndarray]:
         """
@@ -26,17 +31,122 @@ class FinancialPredictor:
             seq_length: 序列长度
         
         Returns:
-            X: 特征序列
+            X: 特征序列（随机森林为float32，线性模型为float64）
             y: 目标值
         """
-        X = []
-        y = []
+        values = data.to_numpy(dtype=np.float64)
+        # 滑动窗口视图一次得到所有长度为seq_length的窗口；最后一个窗口没有对应的目标值，予以舍弃
+        # 窗口视图的行相互重叠，整理为C连续数组后再交给sklearn，避免其在fit/predict中各自再复制一次；
+        # 随机森林内部按float32建树，直接给出float32省去一次类型转换，线性模型保留float64精度
+        x_dtype = np.float32 if self.model_type == "random_forest" else np.float64
+        X = np.ascontiguousarray(sliding_window_view(values, seq_length)[:-1], dtype=x_dtype)
+        y = values[seq_length:]
         
-        for i in range(len(data) - seq_length):
-            X.append(data.iloc[i:i+seq_length].values)
-            y.append(data.iloc[i+seq_length])
+        return X, y
+    
+    @staticmethod
+    def _quarterly_last(series: pd.Series) -> pd.Series:
+        """
+        取每个季度最后一个有效值，索引为季末日期（要求索引按时间升序）
+        
+        直接比较相邻日期的季度编号找出每季最后一行，不构建重采样分组；
+        没有数据的季度不产生空值行
+        """
+        series = series.dropna()
+        if series.empty:
+            return series
+        quarters = series.index.to_period('Q')
+        codes = quarters.asi8
+        last_pos = np.flatnonzero(np.append(codes[1:] != codes[:-1], True))
+        return pd.Series(
+            series.to_numpy()[last_pos],
+            index=quarters[last_pos].end_time.normalize(),
+            name=series.name
+        )
+    
+    @staticmethod
+    def _forecast_index(last_date: pd.Timestamp, periods: int, quarterly: bool) -> pd.DatetimeIndex:
+        """
+        生成预测日期索引：按季度时为之后各季的季末日期，按天时为之后的连续日期
+        
+        直接在季度编号/时间差上做整数运算，不逐个应用DateOffset
+        """
+        if quarterly:
+            # 标量Period加数组得到的是对象数组而非PeriodIndex，需用period_range构建
+            return pd.period_range(last_date.to_period('Q') + 1, periods=periods, freq='Q').end_time.normalize()
+        return last_date + pd.to_timedelta(np.arange(1, periods + 1), unit='D')
+    
+    def _build_model(self):
+        """
+        按模型类型创建未训练的模型；随机森林使用全部CPU核心并行建树
+        训练样本很少，限制树深度即可，浅树在逐步递推预测时遍历更快
+        """
+        if self.model_type == "random_forest":
+            return RandomForestRegressor(n_estimators=100, max_depth=8, random_state=42, n_jobs=self.n_jobs)
+        return LinearRegression()
+    
+    def _fit(self, X: np.ndarray, y: np.ndarray) -> None:
+        """
+        创建并训练模型
+        
+        线性模型只有几列特征，直接对中心化数据做最小二乘求解，
+        结果写回LinearRegression的coef_/intercept_，与sklearn的fit一致，
+        省去其输入校验与调度开销
+        """
+        self.model = self._build_model()
+        if isinstance(self.model, LinearRegression):
+            X_mean = X.mean(axis=0)
+            y_mean = y.mean()
+            coef, *_ = np.linalg.lstsq(X - X_mean, y - y_mean, rcond=None)
+            self.model.coef_ = coef
+            self.model.intercept_ = y_mean - X_mean @ coef
+            self.model.n_features_in_ = X.shape[1]
+        else:
+            self.model.fit(X, y)
+    
+    def _fitted_values(self, X: np.ndarray) -> np.ndarray:
+        """
+        训练样本上的拟合值，用于计算评估指标
+        
+        线性模型直接一次矩阵乘法得到；随机森林的袋外预测在小样本下
+        常有样本缺少袋外树，仍走predict批量计算
+        """
+        if isinstance(self.model, LinearRegression):
+            return X @ self.model.coef_ + self.model.intercept_
+        return self.model.predict(X)
+    
+    def _recursive_forecast(self, history: np.ndarray, steps: int) -> np.ndarray:
+        """
+        自回归递推预测：每一步的预测值作为下一步的输入
+        
+        Args:
+            history: 最近的历史值，长度即序列长度
+            steps: 预测步数
+        
+        Returns:
+            长度为steps的预测值数组
+        """
+        seq_length = len(history)
+        # 历史值与预测值放在同一缓冲区，第i步的输入窗口即buf[i:i+seq_length]，无需滚动数组
+        buf = np.empty(seq_length + steps)
+        buf[:seq_length] = history
         
-        return np.array(X), np.array(y)
+        if isinstance(self.model, LinearRegression):
+            # 线性模型的递推 y[n] = Σ coef[k]·y[n-p+k] + intercept 即一个全极点IIR滤波器：
+            # 以历史值为初始状态、以截距为常数输入，一次lfilter调用在C中完成全部递推
+            a = np.concatenate(([1.0], -self.model.coef_[::-1]))
+            zi = lfiltic([1.0], a, y=history[::-1])
+            buf[seq_length:] = lfilter([1.0], a, np.full(steps, self.model.intercept_), zi=zi)[0]
+        else:
+            # 单行预测时并行调度的开销远大于计算本身，递推阶段改为单线程
+            self.model.set_params(n_jobs=1)
+            # 复用一个(1, seq_length)的float32输入行：窗口原地拷入，sklearn无需每步再转换类型、分配新数组
+            window = np.empty((1, seq_length), dtype=np.float32)
+            for i in range(steps):
+                window[0] = buf[i:i + seq_length]
+                buf[seq_length + i] = self.model.predict(window)[0]
+        
+        return buf[seq_length:]
     
     def predict_pe(self, pe_series: pd.Series, forecast_quarters: int = 2) -> Tuple[pd.DataFrame, Dict[str, float]]:
         """
@@ -53,7 +163,7 @@ class FinancialPredictor:
         # 如果数据是按天的，先转换为季度数据（取每个季度最后一天的数据）
         if pe_series.index.freq is None or pe_series.index.freq < pd.DateOffset(months=3):
             # 按季度重采样，取每个季度最后一个值
-            quarterly_pe = pe_series.resample('Q').last()
+            quarterly_pe = self._quarterly_last(pe_series)
         else:
             quarterly_pe = pe_series
         
@@ -69,37 +179,22 @@ class FinancialPredictor:
         X, y = self._create_sequences(quarterly_pe, actual_sequence_length)
         
         # 训练模型
-        if self.model_type == "random_forest":
-            self.model = RandomForestRegressor(n_estimators=100, random_state=42)
-        else:
-            self.model = LinearRegression()
-        
-        self.model.fit(X, y)
+        self._fit(X, y)
         
         # 预测未来值
-        last_sequence = quarterly_pe.iloc[-actual_sequence_length:].values.reshape(1, -1)
-        forecast = []
-        
-        for _ in range(forecast_quarters):
-            next_pred = self.model.predict(last_sequence)[0]
-            forecast.append(next_pred)
-            
-            # 更新序列，用于下一步预测
-            last_sequence = np.roll(last_sequence, -1)  # 滚动序列
-            last_sequence[0, -1] = next_pred  # 更新最后一个值
+        forecast = self._recursive_forecast(quarterly_pe.to_numpy()[-actual_sequence_length:], forecast_quarters)
         
         # 创建预测索引（按季度）
-        last_date = quarterly_pe.index[-1]
-        forecast_index = pd.date_range(start=last_date + pd.DateOffset(months=3), periods=forecast_quarters, freq="Q")
+        forecast_index = self._forecast_index(quarterly_pe.index[-1], forecast_quarters, quarterly=True)
         
-        # 创建预测结果DataFrame
-        forecast_df = pd.DataFrame({
-            "date": forecast_index,
-            "Forecasted_PE": forecast
-        }).set_index("date")
+        # 创建预测结果DataFrame：预测值数组直接作为列，日期直接作为索引
+        forecast_df = pd.DataFrame(
+            {"Forecasted_PE": forecast},
+            index=forecast_index.rename("date")
+        )
         
         # 计算模型评估指标
-        predictions = self.model.predict(X)
+        predictions = self._fitted_values(X)
         metrics = {
             "mean_absolute_error": mean_absolute_error(y, predictions),
             "r2_score": r2_score(y, predictions)
@@ -123,14 +218,10 @@ class FinancialPredictor:
         # 根据预测类型处理数据
         if forecast_type == "quarterly":
             # 按季度重采样，取每个季度最后一个值
-            processed_data = price_series.resample('Q').last()
-            freq = "Q"
-            offset = pd.DateOffset(months=3)
+            processed_data = self._quarterly_last(price_series)
         else:
             # 使用每日数据
             processed_data = price_series
-            freq = "D"
-            offset = pd.DateOffset(days=1)
         
         # 灵活调整序列长度，如果历史数据不足，使用可用的最大长度
         available_sequence_length = len(processed_data) - 1  # 至少需要1个数据点来创建序列
@@ -144,40 +235,53 @@ class FinancialPredictor:
         X, y = self._create_sequences(processed_data, actual_sequence_length)
         
         # 训练模型
-        if self.model_type == "random_forest":
-            self.model = RandomForestRegressor(n_estimators=100, random_state=42)
-        else:
-            self.model = LinearRegression()
-        
-        self.model.fit(X, y)
+        self._fit(X, y)
         
         # 预测未来值
-        last_sequence = processed_data.iloc[-actual_sequence_length:].values.reshape(1, -1)
-        forecast = []
-        
-        for _ in range(forecast_days):
-            next_pred = self.model.predict(last_sequence)[0]
-            forecast.append(next_pred)
-            
-            # 更新序列，用于下一步预测
-            last_sequence = np.roll(last_sequence, -1)  # 滚动序列
-            last_sequence[0, -1] = next_pred  # 更新最后一个值
+        forecast = self._recursive_forecast(processed_data.to_numpy()[-actual_sequence_length:], forecast_days)
         
         # 创建预测索引
-        last_date = processed_data.index[-1]
-        forecast_index = pd.date_range(start=last_date + offset, periods=forecast_days, freq=freq)
+        forecast_index = self._forecast_index(
+            processed_data.index[-1], forecast_days, quarterly=forecast_type == "quarterly")
         
-        # 创建预测结果DataFrame
-        forecast_df = pd.DataFrame({
-            "date": forecast_index,
-            "Forecasted_Price": forecast
-        }).set_index("date")
+        # 创建预测结果DataFrame：预测值数组直接作为列，日期直接作为索引
+        forecast_df = pd.DataFrame(
+            {"Forecasted_Price": forecast},
+            index=forecast_index.rename("date")
+        )
         
         # 计算模型评估指标
-        predictions = self.model.predict(X)
+        predictions = self._fitted_values(X)
         metrics = {
             "mean_absolute_error": mean_absolute_error(y, predictions),
             "r2_score": r2_score(y, predictions)
         }
         
         return forecast_df, metrics
+
+    def predict_batch(self, pe_series: pd.Series, forecast_quarters: int, price_series: pd.Series,
+                      forecast_days: int = 10, forecast_type: str = "daily"
+                      ) -> Tuple[Tuple[pd.DataFrame, Dict[str, float]], Tuple[pd.DataFrame, Dict[str, float]]]:
+        """
+        同时预测市盈率与股价
+        
+        两个模型相互独立，在两个线程中并发训练（sklearn建树时释放GIL）；
+        两者各分一半CPU核心建树，避免并行线程总数超过核心数；
+        股价模型使用单独的预测器实例，训练后self.model为市盈率模型
+        
+        Returns:
+            (市盈率预测结果, 评估指标), (股价预测结果, 评估指标)
+        """
+        half_cores = max(1, (os.cpu_count() or 2) // 2)
+        price_predictor = FinancialPredictor(model_type=self.model_type)
+        price_predictor.sequence_length = self.sequence_length
+        price_predictor.n_jobs = half_cores
+        n_jobs, self.n_jobs = self.n_jobs, half_cores
+        try:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                pe_future = executor.submit(self.predict_pe, pe_series, forecast_quarters)
+                price_future = executor.submit(
+                    price_predictor.predict_stock_price, price_series, forecast_days, forecast_type)
+                return pe_future.result(), price_future.result()
+        finally:
+            self.n_jobs = n_jobs
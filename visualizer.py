@@ -2,16 +2,35 @@ import pandas as pd
 import streamlit as st
 import altair as alt
 
+def _ensure_datetime_index(df: pd.DataFrame) -> pd.DataFrame:
+    """确保索引是日期类型；已是日期索引时原样返回，否则由date列转换（不整表复制）"""
+    if isinstance(df.index, pd.DatetimeIndex):
+        return df
+    return df.assign(date=pd.to_datetime(df['date'])).set_index('date')
+
+def _layered_chart(layers: list, title: str) -> alt.LayerChart:
+    """组合图层并统一设置尺寸与样式"""
+    return alt.layer(*layers).properties(
+        title=title,
+        width=800,
+        height=300
+    ).configure_title(
+        fontSize=16
+    ).configure_axis(
+        labelFontSize=12,
+        titleFontSize=14,
+        grid=True
+    ).configure_view(
+        stroke=None
+    )
+
 def plot_stock_data(df: pd.DataFrame, forecast_df: pd.DataFrame = None):
     """绘制股票价格图，支持显示预测数据"""
     if df.empty:
         return
     
     # 确保索引是日期类型
-    if not isinstance(df.index, pd.DatetimeIndex):
-        df = df.copy()
-        df['date'] = pd.to_datetime(df['date'])
-        df = df.set_index('date')
+    df = _ensure_datetime_index(df)
     
     # 重置索引以便Altair处理
     df_reset = df.reset_index()
@@ -28,28 +47,13 @@ def plot_stock_data(df: pd.DataFrame, forecast_df: pd.DataFrame = None):
         y=alt.Y('close:Q', title='价格')
     )
     
-    # 组合图表
-    chart = alt.layer(actual_price).properties(
-        title='股票价格走势',
-        width=800,
-        height=300
-    ).configure_title(
-        fontSize=16
-    ).configure_axis(
-        labelFontSize=12,
-        titleFontSize=14,
-        grid=True
-    ).configure_view(
-        stroke=None
-    )
+    layers = [actual_price]
+    title = '股票价格走势'
     
     # 如果有预测数据，添加预测价格线
     if forecast_df is not None and not forecast_df.empty:
         # 确保预测数据的索引是日期类型
-        if not isinstance(forecast_df.index, pd.DatetimeIndex):
-            forecast_df = forecast_df.copy()
-            forecast_df['date'] = pd.to_datetime(forecast_df['date'])
-            forecast_df = forecast_df.set_index('date')
+        forecast_df = _ensure_datetime_index(forecast_df)
         
         forecast_df_reset = forecast_df.reset_index()
         
@@ -65,29 +69,17 @@ def plot_stock_data(df: pd.DataFrame, forecast_df: pd.DataFrame = None):
         )
         
         # 添加到组合图表中
-        chart = alt.layer(actual_price, predicted_price).properties(
-            title='股票价格走势（含预测）',
-            width=800,
-            height=300
-        ).configure_title(
-            fontSize=16
-        ).configure_axis(
-            labelFontSize=12,
-            titleFontSize=14,
-            grid=True
-        ).configure_view(
-            stroke=None
-        )
+        layers.append(predicted_price)
+        title = '股票价格走势（含预测）'
     
+    # 图层确定后只构建一次组合图表
+    chart = _layered_chart(layers, title)
     st.altair_chart(chart, use_container_width=True)
 
 def plot_pe_analysis(pe_df: pd.DataFrame, forecast_df: pd.DataFrame):
     """绘制PE分析图"""
     # 确保索引是日期类型
-    if not isinstance(pe_df.index, pd.DatetimeIndex):
-        pe_df = pe_df.copy()
-        pe_df['date'] = pd.to_datetime(pe_df['date'])
-        pe_df = pe_df.set_index('date')
+    pe_df = _ensure_datetime_index(pe_df)
     
     # 重置索引以便Altair处理
     pe_df_reset = pe_df.reset_index()
@@ -109,28 +101,12 @@ def plot_pe_analysis(pe_df: pd.DataFrame, forecast_df: pd.DataFrame):
         y=alt.Y('PE_MA:Q', title='PE')
     )
     
-    # 组合图表
-    chart = alt.layer(actual_pe, pe_ma).properties(
-        title='市盈率分析',
-        width=800,
-        height=300
-    ).configure_title(
-        fontSize=16
-    ).configure_axis(
-        labelFontSize=12,
-        titleFontSize=14,
-        grid=True
-    ).configure_view(
-        stroke=None
-    )
+    layers = [actual_pe, pe_ma]
     
     # 如果有预测数据，添加预测PE线
     if not forecast_df.empty:
         # 确保预测数据的索引是日期类型
-        if not isinstance(forecast_df.index, pd.DatetimeIndex):
-            forecast_df = forecast_df.copy()
-            forecast_df['date'] = pd.to_datetime(forecast_df['date'])
-            forecast_df = forecast_df.set_index('date')
+        forecast_df = _ensure_datetime_index(forecast_df)
         
         forecast_df_reset = forecast_df.reset_index()
         
@@ -146,18 +122,8 @@ def plot_pe_analysis(pe_df: pd.DataFrame, forecast_df: pd.DataFrame):
         )
         
         # 添加到组合图表中
-        chart = alt.layer(actual_pe, pe_ma, predicted_pe).properties(
-            title='市盈率分析',
-            width=800,
-            height=300
-        ).configure_title(
-            fontSize=16
-        ).configure_axis(
-            labelFontSize=12,
-            titleFontSize=14,
-            grid=True
-        ).configure_view(
-            stroke=None
-        )
+        layers.append(predicted_pe)
     
+    # 图层确定后只构建一次组合图表
+    chart = _layered_chart(layers, '市盈率分析')
     st.altair_chart(chart, use_container_width=True)